@@ -1,14 +1,28 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache, partial
 from io import BytesIO
 import base64
+import json
+import tempfile
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from PIL import Image, ImageOps
 
 # PDF
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph, Spacer
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
 
@@ -23,9 +37,47 @@ IMAGENS_DIR = "imagens"
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(IMAGENS_DIR, exist_ok=True)
 
-AVALIACOES_PATH = os.path.join(DATA_DIR, "avaliacoes.csv")
-IMAGENS_CSV_PATH = os.path.join(DATA_DIR, "imagens.csv")
-AGENDA_PATH = os.path.join(DATA_DIR, "agenda.csv")
+# Cada tabela é uma pasta de fragmentos Parquet: inserir uma linha grava
+# um fragmento novo em vez de reescrever o histórico inteiro.
+STORE_PATHS = {
+    "avaliacoes": os.path.join(DATA_DIR, "avaliacoes"),
+    "imagens": os.path.join(DATA_DIR, "imagens"),
+    "agenda": os.path.join(DATA_DIR, "agenda"),
+}
+
+AVALIACOES_PATH = STORE_PATHS["avaliacoes"]
+IMAGENS_PATH = STORE_PATHS["imagens"]
+AGENDA_PATH = STORE_PATHS["agenda"]
+
+DIAS = ["segunda", "terça", "quarta", "quinta", "sexta", "sábado"]
+
+# Compacta a pasta quando o número de fragmentos passa deste limite.
+LIMITE_FRAGMENTOS = 50
+
+# Avaliações exibidas por página na lista.
+AVALIACOES_POR_PAGINA = 10
+
+# Tipos de cada coluna, aplicados ao gravar para que o Parquet preserve
+# ids inteiros e horário como texto sem conversões a cada leitura.
+SCHEMAS = {
+    AVALIACOES_PATH: {"id": "Int64", "nome": "string", "data": "string"},
+    IMAGENS_PATH: {
+        "avaliacao_id": "Int64",
+        "arquivo": "string",
+        "thumb_arquivo": "string",
+        "data": "string",
+    },
+    AGENDA_PATH: {
+        "id": "Int64",
+        "dia": "string",
+        "horario": "string",
+        "horario_sort": "string",
+        "horario_min": "Int16",
+        "nome": "string",
+        "profissional": "string",
+        "duracao": "Int64",
+    },
+}
 
 # -----------------------------------
 # AUTENTICAÇÃO
@@ -40,259 +92,675 @@ if senha != "sistema.estudio.fernandapeixoto":
 # -----------------------------------
 # CRIAÇÃO DAS ABAS
 # -----------------------------------
+# Com on_change="rerun" só a aba aberta executa seu conteúdo; as outras
+# não carregam dados nem imagens a cada rerun.
 aba_avaliacoes, aba_agenda, aba_comparacao = st.tabs([
     "Avaliações Posturais",
     "Agenda",
     "Comparar Avaliações"
-])
+], key="aba_ativa", on_change="rerun")
 
 # -----------------------------------
 # FUNÇÃO PARA NORMALIZAR HORÁRIO
 # -----------------------------------
+# Aceita 8, 8h, 8h30, 8:30, 08:00 (com ou sem espaços).
+_HORA_RE = re.compile(r"^\s*(\d{1,2})\s*[h:]?\s*(\d{0,2})\s*$", re.IGNORECASE)
+
 def normalizar_horario(h):
+    # Retorna (ordenação "HH:MM", exibição "HHhMM", minutos desde 00:00).
     if not isinstance(h, str):
-        return None, None
-
-    h = h.lower().strip().replace(" ", "")
-    h = h.replace("h", ":")
-
-    if ":" not in h:
-        h = h + ":00"
-    if h.endswith(":"):
-        h = h + "00"
-
-    partes = h.split(":")
-    if len(partes) != 2:
-        return None, None
-
-    hh, mm = partes
-    if not hh.isdigit():
-        return None, None
-    if not mm.isdigit():
-        mm = "00"
-
-    hh = hh.zfill(2)
-    mm = mm.zfill(2)
-
-    return f"{hh}:{mm}", f"{hh}h{mm}"
+        return None, None, None
+    return _normalizar_horario(h)
+
+@lru_cache(maxsize=512)
+def _normalizar_horario(h):
+    m = _HORA_RE.match(h)
+    if not m:
+        return None, None, None
+
+    hh = m.group(1).zfill(2)
+    mm = (m.group(2) or "00").zfill(2)
+    if int(hh) > 23 or int(mm) > 59:
+        return None, None, None
+
+    return f"{hh}:{mm}", f"{hh}h{mm}", int(hh) * 60 + int(mm)
+
+def normalizar_horarios(serie):
+    # Versão vetorizada de normalizar_horario para uma Series inteira.
+    # Retorna colunas horario_sort, horario e horario_min; linhas inválidas
+    # ficam nulas.
+    partes = serie.astype("string").str.extract(_HORA_RE)
+    hh = partes[0].str.zfill(2)
+    mm = partes[1].fillna("").str.zfill(2)
+    horas, mins = pd.to_numeric(hh), pd.to_numeric(mm)
+    ok = ((horas < 24) & (mins < 60)).fillna(False)
+    return pd.DataFrame({
+        "horario_sort": (hh + ":" + mm).where(ok),
+        "horario": (hh + "h" + mm).where(ok),
+        "horario_min": (horas * 60 + mins).where(ok).astype("Int16"),
+    }, index=serie.index)
 
 # -----------------------------------
-# FUNÇÕES DE CSV
+# FUNÇÕES DE ARMAZENAMENTO (PARQUET)
 # -----------------------------------
-def load_csv(path, cols=None):
-    if not os.path.exists(path):
-        return pd.DataFrame(columns=cols if cols else [])
-    df = pd.read_csv(path, dtype=str)
-    if cols:
-        for c in cols:
-            if c not in df.columns:
-                df[c] = None
-        df = df[cols]
+def aplicar_schema(df, path):
+    for c, tipo in SCHEMAS.get(path, {}).items():
+        if c not in df.columns:
+            df[c] = None
+        if tipo == "Int64":
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype("Int64")
+        else:
+            df[c] = df[c].astype(tipo)
     return df
 
-def save_csv(df, path):
-    df.to_csv(path, index=False)
-    try:
-        nome = os.path.basename(path)
-        github_upload_file(
-            local_path=path,
-            path_in_repo=f"data/{nome}",
-            message=f"Atualiza {nome} via Streamlit"
-        )
-    except:
-        pass
+def schema_arrow(path):
+    vazio = aplicar_schema(pd.DataFrame(), path)
+    return pa.Schema.from_pandas(vazio, preserve_index=False)
+
+def listar_fragmentos(path):
+    if not os.path.isdir(path):
+        return []
+    return sorted(f for f in os.listdir(path) if f.endswith(".parquet"))
+
+def gravar_fragmento(df, path):
+    os.makedirs(path, exist_ok=True)
+    df = aplicar_schema(df.copy(), path)
+    tabela = pa.Table.from_pandas(
+        df[list(SCHEMAS[path])], schema=schema_arrow(path), preserve_index=False
+    )
+    nome = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.parquet"
+    pq.write_table(tabela, os.path.join(path, nome), compression="zstd")
+    return nome
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _load_cached(path, mtime, cols, filtro):
+    # mtime da pasta faz parte da chave: todo fragmento novo ou removido
+    # invalida a entrada. As entradas de mtimes antigos nunca mais são
+    # lidas, por isso o cache tem tamanho limitado.
+    dataset = ds.dataset(path, format="parquet", schema=schema_arrow(path))
+    expressao = None
+    if filtro:
+        coluna, valores = filtro
+        expressao = ds.field(coluna).isin(list(valores))
+    return dataset.to_table(
+        columns=list(cols) if cols else None, filter=expressao
+    ).to_pandas()
+
+def load_csv(path, cols=None, filtro=None):
+    # filtro = (coluna, valores): lê só as linhas com coluna em valores.
+    if not listar_fragmentos(path):
+        df = aplicar_schema(pd.DataFrame(columns=cols if cols else []), path)
+        return df[cols] if cols else df
+    return _load_cached(
+        path,
+        os.path.getmtime(path),
+        tuple(cols) if cols else None,
+        (filtro[0], tuple(filtro[1])) if filtro else None
+    )
+
+def save_csv(df, path, defer=False):
+    # Com defer=True só grava no disco; quem chama envia ao GitHub depois.
+    # Pula a gravação (e o envio ao GitHub) quando o conteúdo é o mesmo da
+    # última gravação desta sessão e ninguém alterou a pasta desde então.
+    df = aplicar_schema(df.copy(), path)
+    assinatura = pd.util.hash_pandas_object(df, index=False).sum()
+    ultimas = st.session_state.setdefault("_ultimas_gravacoes", {})
+    mtime = os.path.getmtime(path) if os.path.isdir(path) else None
+    if ultimas.get(path) == (assinatura, mtime):
+        return
 
-def add_row(path, row_dict, cols=None):
-    df = load_csv(path, cols=cols if cols else list(row_dict.keys()))
-    df = pd.concat([df, pd.DataFrame([row_dict])], ignore_index=True)
-    save_csv(df, path)
+    # Reescreve a tabela inteira em um único fragmento (compactação).
+    antigos = listar_fragmentos(path)
+    novo = gravar_fragmento(df, path)
+    for nome in antigos:
+        if nome != novo:
+            os.remove(os.path.join(path, nome))
+    _load_cached.clear()
+    ultimas[path] = (assinatura, os.path.getmtime(path))
+    if not defer:
+        sincronizar_store(path)
+
+def add_row(path, row_dict, defer=False):
+    return add_rows(path, [row_dict], defer=defer)
+
+def add_rows(path, rows, defer=False):
+    # Todas as linhas vão para um único fragmento; retorna o nome dele.
+    # Com defer=True quem chama envia o fragmento e depois chama
+    # compactar_se_preciso.
+    if not rows:
+        return None
+    novo = gravar_fragmento(pd.DataFrame(rows), path)
+    _load_cached.clear()
+    if defer:
+        return novo
+    if not compactar_se_preciso(path):
+        sincronizar_store(path)
+    return novo
+
+def compactar_se_preciso(path):
+    # Reescreve a pasta em um único fragmento quando passa do limite.
+    if len(listar_fragmentos(path)) > LIMITE_FRAGMENTOS:
+        save_csv(load_csv(path), path)
+        return True
+    return False
 
 def fix_ids(df, id_col="id"):
+    # Retorna (df, alterado); alterado indica que os ids foram renumerados
+    # ou convertidos e precisam ser gravados.
     if id_col not in df.columns:
         df[id_col] = None
-    df[id_col] = pd.to_numeric(df[id_col], errors="coerce")
-    if df[id_col].isna().any() or df[id_col].duplicated().any():
+    # Caminho rápido: ids inteiros, sem nulos e sem repetição já estão
+    # corretos, em qualquer ordem.
+    ids = df[id_col]
+    if pd.api.types.is_integer_dtype(ids) and not ids.hasnans and ids.is_unique:
+        return df, False
+    ids = pd.to_numeric(ids, errors="coerce")
+    if ids.hasnans or not ids.is_unique or (ids % 1).any():
         df = df.reset_index(drop=True)
-        df[id_col] = range(1, len(df) + 1)
-    return df
+        df[id_col] = pd.array(np.arange(1, len(df) + 1), dtype="Int64")
+        return df, True
+    # Ids válidos mas em outro tipo (texto, float): converte para Int64 e
+    # pede a gravação, para que a próxima leitura caia no caminho rápido.
+    df[id_col] = ids.astype("Int64")
+    return df, True
+
+def ensure_ids_migrated():
+    # Corrige ids ausentes ou duplicados das avaliações uma vez por sessão;
+    # depois disso os ids só mudam pelos botões de salvar e excluir.
+    if st.session_state.get("_ids_ok"):
+        return
+    aval_df, ids_alterados = fix_ids(
+        load_csv(AVALIACOES_PATH, cols=["id", "nome", "data"])
+    )
+    if ids_alterados:
+        save_csv(aval_df, AVALIACOES_PATH)
+    st.session_state["_ids_ok"] = True
 
 # -----------------------------------
 # FUNÇÕES GITHUB
 # -----------------------------------
+@st.cache_resource
+def _estado_github():
+    # O script é reexecutado a cada interação; a fila de envio e os shas
+    # conhecidos precisam sobreviver aos reruns.
+    return ThreadPoolExecutor(max_workers=2), {}, {}, {}, threading.Lock(), threading.Lock()
+
+# _LEGADOS guarda, por pasta, os arquivos antigos de arquivo único que a
+# próxima sincronização deve apagar do repositório.
+_EXEC, _PENDING, _SHAS, _LEGADOS, _SYNC_LOCK, _COMMIT_LOCK = _estado_github()
+
+@st.cache_resource
+def _sessao_github():
+    # Uma sessão com pool reaproveita a conexão TLS entre chamadas à API.
+    sessao = requests.Session()
+    sessao.headers.update({"Accept": "application/vnd.github+json"})
+    sessao.mount("https://", HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=3, backoff_factor=0.3)
+    ))
+    # Toda chamada tem prazo (conexão, leitura): os envios seguram
+    # _SYNC_LOCK/_COMMIT_LOCK, e uma conexão travada bloquearia os
+    # salvamentos de todas as sessões.
+    sessao.request = partial(sessao.request, timeout=(5, 30))
+    return sessao
+
+_GH = _sessao_github()
+
 def get_github_config():
     token = st.secrets["GITHUB_TOKEN"]
     repo = st.secrets["GITHUB_REPO"]
     branch = st.secrets["GITHUB_BRANCH"]
     base_api = f"https://api.github.com/repos/{repo}/contents"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github+json"
-    }
-    return base_api, headers, branch
+    _GH.headers["Authorization"] = f"token {token}"
+    return base_api, branch
 
 def github_get_file_sha(path_in_repo):
-    base_api, headers, branch = get_github_config()
+    if path_in_repo in _SHAS:
+        return _SHAS[path_in_repo]
+    base_api, branch = get_github_config()
     url = f"{base_api}/{path_in_repo}"
-    r = requests.get(url, headers=headers, params={"ref": branch})
+    r = _GH.get(url, params={"ref": branch})
     if r.status_code == 200:
-        return r.json().get("sha")
+        _SHAS[path_in_repo] = r.json().get("sha")
+        return _SHAS[path_in_repo]
     return None
 
-def github_upload_file(local_path, path_in_repo, message):
-    if not os.path.exists(local_path):
+def _corpo_upload(origem, data):
+    # Monta o JSON em um arquivo temporário, codificando o conteúdo em
+    # blocos múltiplos de 3 bytes: a imagem nunca fica inteira na memória
+    # junto com sua cópia em base64. origem é um caminho local ou bytes.
+    corpo = tempfile.TemporaryFile()
+    corpo.write(json.dumps(data)[:-1].encode("utf-8") + b', "content": "')
+    with open(origem, "rb") if isinstance(origem, str) else BytesIO(origem) as f:
+        for bloco in iter(partial(f.read, 57 * 1024), b""):
+            corpo.write(base64.b64encode(bloco))
+    corpo.write(b'"}')
+    corpo.seek(0)
+    return corpo
+
+def _criar_blob(git_api, origem):
+    with _corpo_upload(origem, {"encoding": "base64"}) as corpo:
+        r = _GH.post(f"{git_api}/blobs", data=corpo, headers={"Content-Type": "application/json"})
+    r.raise_for_status()
+    return r.json()["sha"]
+
+def github_commit_batch(arquivos, message, remover=()):
+    # Grava vários arquivos (e remove outros) em um único commit pela API
+    # Git: um blob por arquivo, depois árvore, commit e atualização do
+    # branch. arquivos é uma lista de (path_in_repo, caminho local ou bytes).
+    base_api, branch = get_github_config()
+    git_api = base_api.removesuffix("/contents") + "/git"
+
+    # Os blobs são independentes entre si; enviá-los em paralelo sobrepõe
+    # as latências das várias fotos de uma avaliação.
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        shas = list(ex.map(partial(_criar_blob, git_api), [origem for _, origem in arquivos]))
+
+    arvore = [
+        {"path": path_in_repo, "mode": "100644", "type": "blob", "sha": sha}
+        for (path_in_repo, _), sha in zip(arquivos, shas)
+    ]
+    for path_in_repo in remover:
+        arvore.append({"path": path_in_repo, "mode": "100644", "type": "blob", "sha": None})
+    if not arvore:
         return
-    base_api, headers, branch = get_github_config()
-    url = f"{base_api}/{path_in_repo}"
 
-    with open(local_path, "rb") as f:
-        content = f.read()
+    # Commits desta instância são serializados; se outro processo avançou
+    # o branch no meio do caminho, refaz a partir do novo topo uma vez.
+    with _COMMIT_LOCK:
+        for tentativa in range(2):
+            r = _GH.get(f"{git_api}/ref/heads/{branch}")
+            r.raise_for_status()
+            topo = r.json()["object"]["sha"]
+            r = _GH.get(f"{git_api}/commits/{topo}")
+            r.raise_for_status()
+            r = _GH.post(f"{git_api}/trees", json={"base_tree": r.json()["tree"]["sha"], "tree": arvore})
+            r.raise_for_status()
+            r = _GH.post(f"{git_api}/commits", json={"message": message, "tree": r.json()["sha"], "parents": [topo]})
+            r.raise_for_status()
+            r = _GH.patch(f"{git_api}/refs/heads/{branch}", json={"sha": r.json()["sha"]})
+            if r.status_code != 422 or tentativa:
+                break
+        r.raise_for_status()
+
+    for item in arvore:
+        if item["sha"]:
+            _SHAS[item["path"]] = item["sha"]
+        else:
+            _SHAS.pop(item["path"], None)
 
-    content_b64 = base64.b64encode(content).decode("utf-8")
-    sha = github_get_file_sha(path_in_repo)
+def github_listar_pasta(path_in_repo):
+    base_api, branch = get_github_config()
+    url = f"{base_api}/{path_in_repo}"
+    r = _GH.get(url, params={"ref": branch})
+    if r.status_code == 200 and isinstance(r.json(), list):
+        remotos = {item["name"]: item["sha"] for item in r.json()}
+        for nome, sha in remotos.items():
+            _SHAS[f"{path_in_repo}/{nome}"] = sha
+        return remotos
+    return {}
+
+def github_sincronizar_pasta(local_dir, path_in_repo, legados=()):
+    # Fragmentos novos e antigos trocam de lugar em um único commit, então
+    # o repositório nunca fica sem os dados nem com a tabela pela metade.
+    # legados são nomes de arquivos vizinhos à pasta (data/agenda.csv...)
+    # apagados no mesmo commit, se ainda existirem no repositório.
+    remotos = github_listar_pasta(path_in_repo)
+    locais = set(listar_fragmentos(local_dir))
+    remover = [f"{path_in_repo}/{nome}" for nome in sorted(set(remotos) - locais)]
+    if legados:
+        pai = os.path.dirname(path_in_repo)
+        vizinhos = github_listar_pasta(pai)
+        remover += [f"{pai}/{nome}" for nome in sorted(legados) if nome in vizinhos]
+    github_commit_batch(
+        [(f"{path_in_repo}/{nome}", os.path.join(local_dir, nome)) for nome in sorted(locais - set(remotos))],
+        message=f"Atualiza {path_in_repo} via Streamlit",
+        remover=remover
+    )
 
-    data = {"message": message, "content": content_b64, "branch": branch}
-    if sha:
-        data["sha"] = sha
+def sincronizar_store(path):
+    # Agenda o envio em segundo plano; várias gravações seguidas da mesma
+    # pasta resultam em uma única sincronização.
+    _PENDING[path] = pedido = object()
+    _EXEC.submit(_enviar_store, path, pedido)
 
-    requests.put(url, headers=headers, json=data)
+def _enviar_store(path, pedido):
+    if _PENDING.get(path) is not pedido:
+        return
+    time.sleep(0.2)
+    if _PENDING.get(path) is not pedido:
+        return
+    with _SYNC_LOCK:
+        try:
+            legados = set(_LEGADOS.get(path, ()))
+            github_sincronizar_pasta(path, f"data/{os.path.basename(path)}", legados)
+            _LEGADOS[path] = _LEGADOS.get(path, set()) - legados
+        except:
+            pass
+
+def enviar_fotos(arquivos):
+    # Reenvia em segundo plano fotos cujo commit falhou. arquivos é uma
+    # lista de (path_in_repo, caminho_local); as cópias locais continuam
+    # sendo exibidas enquanto isso.
+    _EXEC.submit(_enviar_fotos, arquivos)
+
+def _enviar_fotos(arquivos):
+    for espera in (5, 30, 120):
+        time.sleep(espera)
+        try:
+            github_commit_batch(arquivos, message="Adiciona fotos via Streamlit")
+            return
+        except:
+            pass
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _baixar_imagem_cached(repo, branch, nome_arquivo):
+    # Os nomes levam data/hora e nunca são reaproveitados, então o
+    # conteúdo baixado pode ficar em cache entre reruns. Repositório e
+    # branch entram na chave; falhas levantam exceção para não serem
+    # guardadas no cache.
+    # O token é opcional: só é preciso para repositórios privados.
+    token = st.secrets.get("GITHUB_TOKEN")
+    headers = {"Authorization": f"token {token}"} if token else {}
+    url = f"https://raw.githubusercontent.com/{repo}/{branch}/imagens/{nome_arquivo}"
+    r = _GH.get(url, headers=headers)
+    r.raise_for_status()
+    return r.content
 
 def baixar_imagem_github(nome_arquivo):
-    repo = st.secrets["GITHUB_REPO"]
-    branch = st.secrets["GITHUB_BRANCH"]
-    url = f"https://raw.githubusercontent.com/{repo}/{branch}/imagens/{nome_arquivo}"
-    r = requests.get(url)
-    return r.content if r.status_code == 200 else None
+    try:
+        return _baixar_imagem_cached(st.secrets["GITHUB_REPO"], st.secrets["GITHUB_BRANCH"], nome_arquivo)
+    except requests.RequestException:
+        return None
+
+def carregar_imagem(nome_arquivo, presentes):
+    # Imagens que vieram com o repositório são lidas do disco; as demais
+    # são baixadas do GitHub.
+    if nome_arquivo in presentes:
+        return os.path.join(IMAGENS_DIR, nome_arquivo)
+    return baixar_imagem_github(nome_arquivo)
+
+def apagar_imagens_github(nomes, message):
+    # Apaga as fotos em um único commit. Um caminho ausente no repositório
+    # faria a árvore falhar, então só entram os que têm sha.
+    caminhos = [f"imagens/{nome}" for nome in nomes]
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        shas = list(ex.map(github_get_file_sha, caminhos))
+    github_commit_batch([], message, remover=[c for c, sha in zip(caminhos, shas) if sha])
 
-def apagar_imagem_github(nome_arquivo):
-    repo_path = f"imagens/{nome_arquivo}"
-    sha = github_get_file_sha(repo_path)
-    if not sha:
-        return
-    base_api, headers, branch = get_github_config()
-    url = f"{base_api}/{repo_path}"
-    data = {"message": f"Remove {nome_arquivo}", "sha": sha, "branch": branch}
-    requests.delete(url, headers=headers, json=data)
+# -----------------------------------
+# FUNÇÕES DE IMAGEM
+# -----------------------------------
+def gerar_versoes(arquivo):
+    # Retorna os bytes JPEG da foto reduzida a 1600 px e da miniatura de
+    # 640 px, ambas da mesma imagem decodificada e sem passar pelo disco.
+    img = ImageOps.exif_transpose(Image.open(arquivo)).convert("RGB")
+    versoes = []
+    for lado, qualidade in ((1600, 85), (640, 82)):
+        img.thumbnail((lado, lado), Image.LANCZOS)
+        buffer = BytesIO()
+        img.save(buffer, "JPEG", quality=qualidade, optimize=True)
+        versoes.append(buffer.getvalue())
+    return versoes
+
+# -----------------------------------
+# MIGRAÇÃO DOS ARQUIVOS ANTIGOS
+# -----------------------------------
+# Converte uma única vez o .parquet ou .csv de arquivo único na pasta de
+# fragmentos correspondente. Os arquivos antigos saem do disco e, na
+# sincronização seguinte, do repositório; um checkout que ainda os traga
+# junto da pasta já migrada também os descarta.
+for path in STORE_PATHS.values():
+    legados = [l for l in (path + ".parquet", path + ".csv") if os.path.exists(l)]
+    if not legados:
+        continue
+    _LEGADOS.setdefault(path, set()).update(os.path.basename(l) for l in legados)
+    if not listar_fragmentos(path):
+        legado = legados[0]
+        if legado.endswith(".csv"):
+            df = pd.read_csv(legado, dtype=str, engine="pyarrow")
+        else:
+            df = pd.read_parquet(legado)
+        save_csv(df, path)
+    for legado in legados:
+        os.remove(legado)
+    sincronizar_store(path)
+
+# =====================================================================
+# AÇÕES DOS BOTÕES
+# =====================================================================
+# Executadas como callbacks: o Streamlit roda a ação antes do rerun do
+# clique, então a página já é desenhada com os dados novos, sem um
+# st.rerun() extra.
+def excluir_avaliacao(aval_id):
+    todas_imagens = load_csv(IMAGENS_PATH)
+    fotos = todas_imagens[todas_imagens["avaliacao_id"] == aval_id]
+    nomes = fotos["arquivo"].dropna().tolist() + fotos["thumb_arquivo"].dropna().tolist()
+    if nomes:
+        try:
+            apagar_imagens_github(nomes, message=f"Remove fotos da avaliação {aval_id}")
+        except:
+            pass
+
+    save_csv(todas_imagens[todas_imagens["avaliacao_id"] != aval_id], IMAGENS_PATH)
+
+    aval_df = load_csv(AVALIACOES_PATH)
+    save_csv(aval_df[aval_df["id"] != aval_id], AVALIACOES_PATH)
+
+    st.session_state["aviso_avaliacoes"] = "Avaliação removida."
+
+def excluir_horario(id_agenda):
+    agenda_df = carregar_agenda(AGENDA_PATH)[0]
+    save_csv(agenda_df.drop(id_agenda, errors="ignore"), AGENDA_PATH)
+
+def adicionar_horario(dia):
+    horario_sort, horario_display, horario_min = normalizar_horario(st.session_state[f"hora_{dia}"])
+    nome = st.session_state[f"nome_{dia}"]
+    profissional = st.session_state[f"prof_{dia}"]
+
+    if not horario_sort:
+        st.session_state[f"aviso_{dia}"] = ("erro", "Horário inválido. Exemplos: 8, 8h, 8h00, 08:00")
+    elif nome.strip() == "" or profissional.strip() == "":
+        st.session_state[f"aviso_{dia}"] = ("erro", "Preencha horário, nome e profissional.")
+    else:
+        agenda_df = carregar_agenda(AGENDA_PATH)[0]
+        novo_id = 1 if agenda_df.empty else int(agenda_df["id"].max()) + 1
+
+        add_row(AGENDA_PATH, {
+            "id": novo_id,
+            "dia": dia,
+            "horario": horario_display,
+            "horario_sort": horario_sort,
+            "horario_min": horario_min,
+            "nome": nome,
+            "profissional": profissional,
+            "duracao": st.session_state[f"dur_{dia}"]
+        })
+
+        st.session_state[f"aviso_{dia}"] = ("sucesso", "Horário adicionado.")
 
 # =====================================================================
 # AVALIAÇÕES POSTURAIS
 # =====================================================================
 with aba_avaliacoes:
-    st.header("Registro de Avaliações Posturais")
-
-    aval_df = load_csv(AVALIACOES_PATH, cols=["id", "nome", "data"])
-    aval_df = fix_ids(aval_df)
-    save_csv(aval_df, AVALIACOES_PATH)
+    if aba_avaliacoes.open:
+        st.header("Registro de Avaliações Posturais")
 
-    img_df = load_csv(IMAGENS_CSV_PATH, cols=["avaliacao_id", "arquivo", "data"])
+        imagens_locais = {e.name for e in os.scandir(IMAGENS_DIR) if e.is_file()}
 
-    st.subheader("Filtrar avaliações")
-    filtro = st.text_input("Digite parte do nome para filtrar")
-
-    aval_filtradas = (
-        aval_df[aval_df["nome"].str.contains(filtro, case=False, na=False)]
-        if filtro.strip() else aval_df
-    )
+        ensure_ids_migrated()
+        aval_df = load_csv(AVALIACOES_PATH, cols=["id", "nome", "data"])
 
-    st.markdown("---")
+        st.subheader("Filtrar avaliações")
+        filtro = st.text_input("Digite parte do nome para filtrar")
 
-    st.subheader("Criar nova avaliação")
-
-    nome = st.text_input("Nome da pessoa avaliada")
-    data_av = st.date_input("Data da avaliação")
-
-    uploaded = st.file_uploader(
-        "Fotos da avaliação", type=["png", "jpg", "jpeg"], accept_multiple_files=True
-    )
-
-    if st.button("Salvar avaliação", key="salvar_avaliacao"):
-        if nome.strip() == "":
-            st.error("O nome é obrigatório.")
+        # Busca literal (sem regex) sobre os nomes em minúsculas.
+        filtro_lc = filtro.strip().lower()
+        if filtro_lc:
+            nomes_lc = aval_df["nome"].fillna("").str.lower().to_numpy(dtype=str)
+            aval_filtradas = aval_df[np.char.find(nomes_lc, filtro_lc) >= 0]
         else:
-            novo_id = 1 if aval_df.empty else int(aval_df["id"].max()) + 1
-
-            add_row(AVALIACOES_PATH, {
-                "id": novo_id,
-                "nome": nome,
-                "data": data_av
-            })
-
-            if uploaded:
-                for file in uploaded:
-                    file_name = f"{novo_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.name}"
-                    file_path = os.path.join(IMAGENS_DIR, file_name)
-
-                    with open(file_path, "wb") as f:
-                        f.write(file.getbuffer())
-
-                    github_upload_file(
-                        local_path=file_path,
-                        path_in_repo=f"imagens/{file_name}",
-                        message=f"Adiciona imagem {file_name} via Streamlit"
-                    )
-
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
+            aval_filtradas = aval_df
 
-                    add_row(IMAGENS_CSV_PATH, {
-                        "avaliacao_id": novo_id,
-                        "arquivo": file_name,
-                        "data": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
-
-            st.success("Avaliação registrada com sucesso.")
-            st.rerun()
-
-    st.markdown("---")
-    st.subheader("Avaliações registradas")
+        # Só as fotos das avaliações exibidas; o filtro é aplicado na leitura.
+        img_df = load_csv(
+            IMAGENS_PATH,
+            cols=["avaliacao_id", "arquivo", "thumb_arquivo", "data"],
+            filtro=("avaliacao_id", aval_filtradas["id"].dropna().tolist())
+        )
 
-    if aval_filtradas.empty:
-        st.info("Nenhuma avaliação encontrada.")
-    else:
-        for _, row in aval_filtradas.sort_values("data", ascending=False).iterrows():
-            st.markdown(f"### {row['nome']} — {row['data']}")
+        st.markdown("---")
 
-            fotos = img_df[img_df["avaliacao_id"] == row["id"]]
+        st.subheader("Criar nova avaliação")
 
-            texto_export = (
-                f"Avaliação Postural\n"
-                f"Nome: {row['nome']}\n"
-                f"Data: {row['data']}\n"
-                f"Fotos: {len(fotos)} imagens\n"
-            )
+        # Formulário: digitar nos campos não dispara reruns até o envio.
+        with st.form("form_avaliacao"):
+            nome = st.text_input("Nome da pessoa avaliada")
+            data_av = st.date_input("Data da avaliação")
 
-            st.download_button(
-                "Baixar avaliação (.txt)",
-                texto_export,
-                file_name=f"avaliacao_{row['id']}.txt",
-                key=f"baixar_avaliacao_{row['id']}"
+            uploaded = st.file_uploader(
+                "Fotos da avaliação", type=["png", "jpg", "jpeg"], accept_multiple_files=True
             )
 
-            if st.button("Excluir avaliação", key=f"del_avaliacao_{row['id']}"):
-                for _, frow in fotos.iterrows():
-                    apagar_imagem_github(frow["arquivo"])
+            salvar = st.form_submit_button("Salvar avaliação", key="salvar_avaliacao")
 
-                img_df = img_df[img_df["avaliacao_id"] != row["id"]]
-                save_csv(img_df, IMAGENS_CSV_PATH)
+        if salvar:
+            if nome.strip() == "":
+                st.error("O nome é obrigatório.")
+            else:
+                novo_id = 1 if aval_df.empty else int(aval_df["id"].max()) + 1
+
+                # Tudo o que este envio grava vai ao GitHub em um único commit.
+                lote = []
+
+                fragmento = add_row(AVALIACOES_PATH, {
+                    "id": novo_id,
+                    "nome": nome,
+                    "data": data_av
+                }, defer=True)
+                lote.append((f"data/avaliacoes/{fragmento}", os.path.join(AVALIACOES_PATH, fragmento)))
+
+                novas_imagens = []
+                if uploaded:
+                    for i, file in enumerate(uploaded):
+                        # O índice distingue arquivos de mesmo nome-base
+                        # (IMG_1.png e IMG_1.jpeg) enviados no mesmo segundo.
+                        base_name = f"{novo_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{i}_{os.path.splitext(file.name)[0]}"
+                        file_name = f"{base_name}.jpg"
+                        thumb_name = f"thumb_{base_name}.jpg"
+                        foto, miniatura = gerar_versoes(file)
+
+                        lote.append((f"imagens/{file_name}", foto))
+                        lote.append((f"imagens/{thumb_name}", miniatura))
+
+                        novas_imagens.append({
+                            "avaliacao_id": novo_id,
+                            "arquivo": file_name,
+                            "thumb_arquivo": thumb_name,
+                            "data": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        })
+
+                fragmento = add_rows(IMAGENS_PATH, novas_imagens, defer=True)
+                if fragmento:
+                    lote.append((f"data/imagens/{fragmento}", os.path.join(IMAGENS_PATH, fragmento)))
+
+                try:
+                    github_commit_batch(lote, message=f"Adiciona avaliação {novo_id} via Streamlit")
+                except Exception:
+                    # As tabelas seguem pela sincronização em segundo plano; as
+                    # fotos são gravadas no disco, exibidas de lá e reenviadas
+                    # por um job próprio. Se todas as tentativas falharem, elas
+                    # se perdem quando o contêiner reiniciar.
+                    sincronizar_store(AVALIACOES_PATH)
+                    sincronizar_store(IMAGENS_PATH)
+                    fotos = []
+                    for path_in_repo, conteudo in lote:
+                        if path_in_repo.startswith("imagens/"):
+                            local_path = os.path.join(IMAGENS_DIR, os.path.basename(path_in_repo))
+                            with open(local_path, "wb") as f:
+                                f.write(conteudo)
+                            fotos.append((path_in_repo, local_path))
+                    if fotos:
+                        enviar_fotos(fotos)
+
+                for path in (AVALIACOES_PATH, IMAGENS_PATH):
+                    compactar_se_preciso(path)
+
+                st.success("Avaliação registrada com sucesso.")
+                st.rerun()
 
-                aval_df = aval_df[aval_df["id"] != row["id"]]
-                save_csv(aval_df, AVALIACOES_PATH)
+        st.markdown("---")
+        st.subheader("Avaliações registradas")
 
-                st.success("Avaliação removida.")
-                st.rerun()
+        aviso = st.session_state.pop("aviso_avaliacoes", None)
+        if aviso:
+            st.success(aviso)
 
-            if fotos.empty:
-                st.write("Sem fotos registradas.")
-            else:
-                cols = st.columns(3)
-                for idx, (_, frow) in enumerate(fotos.iterrows()):
-                    with cols[idx % 3]:
-                        conteudo = baixar_imagem_github(frow["arquivo"])
-                        if conteudo:
-                            st.image(conteudo, caption=frow["data"])
-                        else:
-                            st.warning("Imagem não encontrada no GitHub.")
+        if aval_filtradas.empty:
+            st.info("Nenhuma avaliação encontrada.")
+        else:
+            # Agrupa as fotos uma vez em vez de filtrar img_df a cada avaliação.
+            fotos_por_aval = dict(tuple(img_df.groupby("avaliacao_id", sort=False)))
+
+            # Mostra AVALIACOES_POR_PAGINA avaliações por vez.
+            ordenadas = aval_filtradas.sort_values("data", ascending=False)
+            paginas = -(-len(ordenadas) // AVALIACOES_POR_PAGINA)
+            pagina = 1
+            if paginas > 1:
+                pagina = st.slider("Página", 1, paginas, 1, key="pagina_avaliacoes")
+            inicio = (pagina - 1) * AVALIACOES_POR_PAGINA
+
+            for _, row in ordenadas.iloc[inicio:inicio + AVALIACOES_POR_PAGINA].iterrows():
+                st.markdown(f"### {row['nome']} — {row['data']}")
+
+                fotos = fotos_por_aval.get(row["id"], img_df.iloc[:0])
+
+                texto_export = (
+                    f"Avaliação Postural\n"
+                    f"Nome: {row['nome']}\n"
+                    f"Data: {row['data']}\n"
+                    f"Fotos: {len(fotos)} imagens\n"
+                )
+
+                st.download_button(
+                    "Baixar avaliação (.txt)",
+                    texto_export,
+                    file_name=f"avaliacao_{row['id']}.txt",
+                    key=f"baixar_avaliacao_{row['id']}"
+                )
+
+                st.button(
+                    "Excluir avaliação",
+                    key=f"del_avaliacao_{row['id']}",
+                    on_click=excluir_avaliacao,
+                    args=(row["id"],)
+                )
+
+                if fotos.empty:
+                    st.write("Sem fotos registradas.")
+                else:
+                    # As fotos só são carregadas com o expansor aberto.
+                    with st.expander(
+                        f"Fotos ({len(fotos)})",
+                        key=f"fotos_avaliacao_{row['id']}",
+                        on_change="rerun"
+                    ) as galeria:
+                        if galeria.open:
+                            cols = st.columns(3)
+                            for idx, (_, frow) in enumerate(fotos.iterrows()):
+                                with cols[idx % 3]:
+                                    # Fotos antigas não têm miniatura: usa o original.
+                                    exibida = frow["thumb_arquivo"]
+                                    if not isinstance(exibida, str):
+                                        exibida = frow["arquivo"]
+                                    conteudo = carregar_imagem(exibida, imagens_locais)
+                                    if conteudo:
+                                        st.image(conteudo, caption=frow["data"])
+                                    else:
+                                        st.warning("Imagem não encontrada no GitHub.")
 
-            st.markdown("---")
+                st.markdown("---")
 
 # =====================================================================
 # FUNÇÕES DE LIMPEZA DA AGENDA
@@ -305,62 +773,102 @@ def limpar_agenda(df):
     return df.reset_index(drop=True)
 
 def corrigir_horarios_antigos(df):
+    # Retorna (df, alterado); alterado indica que algum horário foi reescrito.
     if df.empty:
-        return df
-    if "horario_sort" not in df.columns:
-        df["horario_sort"] = None
-    for idx, row in df.iterrows():
-        h = row["horario"]
-        if not isinstance(h, str):
-            continue
-        if " " in h:
-            h = h.split(" ")[-1]
-        h_sort, h_disp = normalizar_horario(h)
-        if h_sort:
-            df.at[idx, "horario_sort"] = h_sort
-            df.at[idx, "horario"] = h_disp
-    return df
+        return df, False
+    for c in ("horario_sort", "horario_min"):
+        if c not in df.columns:
+            df[c] = None
+    h = df["horario"].astype("string").str.strip().str.split(" ").str[-1]
+    novos = normalizar_horarios(h)
+    ok = novos["horario_min"].notna().to_numpy(dtype=bool)
+
+    novo_sort = novos.loc[ok, "horario_sort"]
+    novo_disp = novos.loc[ok, "horario"]
+    novo_min = novos.loc[ok, "horario_min"]
+    igual = (
+        df.loc[ok, "horario_sort"].astype("string").eq(novo_sort).fillna(False)
+        & df.loc[ok, "horario"].astype("string").eq(novo_disp).fillna(False)
+        & df.loc[ok, "horario_min"].astype("Int16").eq(novo_min).fillna(False)
+    )
+
+    df.loc[ok, "horario_sort"] = novo_sort
+    df.loc[ok, "horario"] = novo_disp
+    df.loc[ok, "horario_min"] = novo_min
+    return df, not igual.all()
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _agenda_corrigida(path, mtime):
+    df = load_csv(
+        path,
+        cols=[
+            "id", "dia", "horario", "horario_sort", "horario_min",
+            "nome", "profissional", "duracao"
+        ]
+    )
+    total = len(df)
+    df = limpar_agenda(df)
+    df, horarios_alterados = corrigir_horarios_antigos(df)
+
+    df, ids_alterados = fix_ids(df[df["horario_min"].notna()])
+    alterada = len(df) != total or horarios_alterados or ids_alterados
+
+    # dia vira categoria ordenada pela semana: comparações e agrupamento
+    # usam os códigos inteiros. Dias fora de DIAS viram categorias extras
+    # para não se perderem na próxima gravação.
+    extras = sorted(set(df["dia"].dropna()) - set(DIAS))
+    df = df.assign(dia=pd.Categorical(df["dia"], categories=DIAS + extras, ordered=True))
+
+    # Ordena uma única vez; a tela e o PDF leem os mesmos grupos por dia.
+    df = df.sort_values(["dia", "horario_min"])
+    # Indexa pelo id (único após fix_ids) para excluir por rótulo.
+    df = df.set_index(df["id"].to_numpy(dtype="int64"))
+    por_dia = {dia: dia_df for dia, dia_df in df.groupby("dia", sort=False, observed=True)}
+    return df, por_dia, alterada
+
+def carregar_agenda(path):
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    return _agenda_corrigida(path, mtime)
 
 # =====================================================================
 # FUNÇÃO PARA GERAR PDF DA AGENDA
 # =====================================================================
-def gerar_pdf_agenda(df):
+# Estilos montados uma vez e compartilhados por todas as tabelas do PDF.
+STYLES = getSampleStyleSheet()
+HEADER_STYLE = TableStyle([
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ("GRID", (0, 0), (-1, -1), 1, colors.black),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+])
+
+def gerar_pdf_agenda(por_dia):
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=landscape(A4))
-    styles = getSampleStyleSheet()
     story = []
 
-    story.append(Paragraph("_Agenda Semanal_", styles["Title"]))
+    story.append(Paragraph("_Agenda Semanal_", STYLES["Title"]))
     story.append(Spacer(1, 20))
 
-    dias = ["segunda", "terça", "quarta", "quinta", "sexta", "sábado"]
-
-    for dia in dias:
-        story.append(Paragraph(dia.capitalize(), styles["Title"]))
+    for dia in DIAS:
+        story.append(Paragraph(dia.capitalize(), STYLES["Title"]))
 
-        dia_df = df[df["dia"] == dia].sort_values("horario_sort")
+        dia_df = por_dia.get(dia)
 
-        if dia_df.empty:
-            story.append(Paragraph("Sem horários.", styles["Normal"]))
+        if dia_df is None or dia_df.empty:
+            story.append(Paragraph("Sem horários.", STYLES["Normal"]))
             story.append(Spacer(1, 12))
             continue
 
         tabela = [["Horário", "Nome", "Profissional", "Duração"]]
+        tabela += [
+            [horario, nome, profissional, f"{duracao} min"]
+            for horario, nome, profissional, duracao
+            in dia_df[["horario", "nome", "profissional", "duracao"]].to_numpy()
+        ]
 
-        for _, row in dia_df.iterrows():
-            tabela.append([
-                row["horario"],
-                row["nome"],
-                row["profissional"],
-                f"{row['duracao']} min"
-            ])
-
-        t = Table(tabela)
-        t.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-            ("GRID", (0, 0), (-1, -1), 1, colors.black),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ]))
+        # LongTable repete o cabeçalho quando um dia cheio quebra de página.
+        t = LongTable(tabela, repeatRows=1)
+        t.setStyle(HEADER_STYLE)
 
         story.append(t)
         story.append(Spacer(1, 20))
@@ -372,146 +880,153 @@ def gerar_pdf_agenda(df):
 # AGENDA
 # =====================================================================
 with aba_agenda:
-    st.header("Agenda da Semana")
-
-    agenda_df = load_csv(
-        AGENDA_PATH,
-        cols=["id", "dia", "horario", "horario_sort", "nome", "profissional", "duracao"]
-    )
-
-    agenda_df = limpar_agenda(agenda_df)
-    agenda_df = corrigir_horarios_antigos(agenda_df)
-
-    agenda_df["horario_sort"] = pd.to_datetime(
-        agenda_df["horario_sort"], format="%H:%M", errors="coerce"
-    )
-
-    agenda_df = agenda_df.dropna(subset=["horario_sort"])
-    agenda_df = fix_ids(agenda_df)
-    save_csv(agenda_df, AGENDA_PATH)
-
-    st.subheader("Exportação da agenda")
-    if st.button("Gerar PDF da agenda semanal", key="gerar_pdf"):
-        pdf_bytes = gerar_pdf_agenda(agenda_df)
-        st.download_button(
-            label="Baixar agenda semanal em PDF",
-            data=pdf_bytes,
-            file_name="agenda_semanal.pdf",
-            mime="application/pdf",
-            key="baixar_pdf"
-        )
+    if aba_agenda.open:
+        st.header("Agenda da Semana")
 
-    st.markdown("---")
-    st.subheader("Gerenciamento da agenda")
+        agenda_df, por_dia, agenda_alterada = carregar_agenda(AGENDA_PATH)
+        if agenda_alterada:
+            save_csv(agenda_df, AGENDA_PATH)
 
-    dias = ["segunda", "terça", "quarta", "quinta", "sexta", "sábado"]
-    col_dias = st.columns(len(dias))
+        st.subheader("Exportação da agenda")
+        if st.button("Gerar PDF da agenda semanal", key="gerar_pdf"):
+            pdf_bytes = gerar_pdf_agenda(por_dia)
+            st.download_button(
+                label="Baixar agenda semanal em PDF",
+                data=pdf_bytes,
+                file_name="agenda_semanal.pdf",
+                mime="application/pdf",
+                key="baixar_pdf"
+            )
 
-    for i, dia in enumerate(dias):
-        with col_dias[i]:
-            st.subheader(dia.capitalize())
+        st.markdown("---")
+        st.subheader("Gerenciamento da agenda")
 
-            dia_df = agenda_df[agenda_df["dia"] == dia].sort_values("horario_sort")
+        col_dias = st.columns(len(DIAS))
 
-            for _, row in dia_df.iterrows():
-                st.markdown(f"**{row['horario']}** — {row['nome']} ({row['profissional']})")
-                st.caption(f"{row['duracao']} min")
+        for i, dia in enumerate(DIAS):
+            with col_dias[i]:
+                st.subheader(dia.capitalize())
 
-                if st.button("Excluir", key=f"del_agenda_{row['id']}"):
-                    agenda_df = agenda_df[agenda_df["id"] != row["id"]]
-                    save_csv(agenda_df, AGENDA_PATH)
-                    st.rerun()
+                dia_df = por_dia.get(dia, agenda_df.iloc[:0])
 
-                st.markdown("---")
+                linhas = dia_df[["id", "horario", "nome", "profissional", "duracao"]].itertuples(index=False, name=None)
+                for id_agenda, horario, nome, profissional, duracao in linhas:
+                    st.markdown(f"**{horario}** — {nome} ({profissional})")
+                    st.caption(f"{duracao} min")
 
-            st.markdown("**Novo horário**")
-            horario_raw = st.text_input(f"Horário ({dia})", key=f"hora_{dia}")
-            nome = st.text_input("Nome", key=f"nome_{dia}")
-            profissional = st.text_input("Profissional", key=f"prof_{dia}")
-
-            duracao = st.number_input(
-                "Duração (min)",
-                min_value=10,
-                max_value=180,
-                step=5,
-                value=45,
-                key=f"dur_{dia}"
-            )
-
-            if st.button(f"Adicionar {dia}", key=f"add_horario_{dia}"):
-                horario_sort, horario_display = normalizar_horario(horario_raw)
+                    st.button(
+                        "Excluir",
+                        key=f"del_agenda_{id_agenda}",
+                        on_click=excluir_horario,
+                        args=(id_agenda,)
+                    )
 
-                if not horario_sort:
-                    st.error("Horário inválido. Exemplos: 8, 8h, 8h00, 08:00")
-                elif nome.strip() == "" or profissional.strip() == "":
-                    st.error("Preencha horário, nome e profissional.")
-                else:
-                    novo_id = 1 if agenda_df.empty else int(agenda_df["id"].max()) + 1
+                    st.markdown("---")
+
+                with st.form(f"form_{dia}", clear_on_submit=True):
+                    st.markdown("**Novo horário**")
+                    st.text_input(f"Horário ({dia})", key=f"hora_{dia}")
+                    st.text_input("Nome", key=f"nome_{dia}")
+                    st.text_input("Profissional", key=f"prof_{dia}")
+
+                    st.number_input(
+                        "Duração (min)",
+                        min_value=10,
+                        max_value=180,
+                        step=5,
+                        value=45,
+                        key=f"dur_{dia}"
+                    )
 
-                    add_row(AGENDA_PATH, {
-                        "id": novo_id,
-                        "dia": dia,
-                        "horario": horario_display,
-                        "horario_sort": horario_sort,
-                        "nome": nome,
-                        "profissional": profissional,
-                        "duracao": duracao
-                    })
+                    st.form_submit_button(
+                        f"Adicionar {dia}",
+                        key=f"add_horario_{dia}",
+                        on_click=adicionar_horario,
+                        args=(dia,)
+                    )
 
-                    st.success("Horário adicionado.")
-                    st.rerun()
+                aviso = st.session_state.pop(f"aviso_{dia}", None)
+                if aviso:
+                    tipo, texto = aviso
+                    if tipo == "erro":
+                        st.error(texto)
+                    else:
+                        st.success(texto)
 
 # =====================================================================
 # COMPARAÇÃO ENTRE AVALIAÇÕES
 # =====================================================================
 with aba_comparacao:
-    st.header("Comparar Avaliações Posturais")
+    if aba_comparacao.open:
+        st.header("Comparar Avaliações Posturais")
 
-    aval_df = load_csv(AVALIACOES_PATH, cols=["id", "nome", "data"])
-    img_df = load_csv(IMAGENS_CSV_PATH, cols=["avaliacao_id", "arquivo", "data"])
+        imagens_locais = {e.name for e in os.scandir(IMAGENS_DIR) if e.is_file()}
 
-    if aval_df.empty:
-        st.info("Nenhuma avaliação registrada ainda.")
-    else:
-        col1, col2 = st.columns(2)
+        aval_df = load_csv(AVALIACOES_PATH, cols=["id", "nome", "data"])
 
-        with col1:
-            id1 = st.selectbox(
-                "Selecione a primeira avaliação",
+        if aval_df.empty:
+            st.info("Nenhuma avaliação registrada ainda.")
+        else:
+            labels = dict(zip(
                 aval_df["id"].tolist(),
-                format_func=lambda x: f"{aval_df.loc[aval_df['id']==x,'nome'].values[0]} — {aval_df.loc[aval_df['id']==x,'data'].values[0]}",
-                key="sel1"
-            )
+                (aval_df["nome"] + " — " + aval_df["data"].astype(str)).tolist()
+            ))
+
+            # Trocar as avaliações não dispara reruns; as fotos só são buscadas
+            # depois de "Carregar comparação".
+            with st.form("form_comparacao"):
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    id1 = st.selectbox(
+                        "Selecione a primeira avaliação",
+                        aval_df["id"].tolist(),
+                        format_func=labels.get,
+                        key="sel1"
+                    )
 
-        with col2:
-            id2 = st.selectbox(
-                "Selecione a segunda avaliação",
-                aval_df["id"].tolist(),
-                format_func=lambda x: f"{aval_df.loc[aval_df['id']==x,'nome'].values[0]} — {aval_df.loc[aval_df['id']==x,'data'].values[0]}",
-                key="sel2"
-            )
+                with col2:
+                    id2 = st.selectbox(
+                        "Selecione a segunda avaliação",
+                        aval_df["id"].tolist(),
+                        format_func=labels.get,
+                        key="sel2"
+                    )
 
-        st.markdown("## Comparação lado a lado")
+                if st.form_submit_button("Carregar comparação", key="carregar_comparacao"):
+                    st.session_state["comparacao"] = (id1, id2)
 
-        fotos1 = img_df[img_df["avaliacao_id"] == id1]
-        fotos2 = img_df[img_df["avaliacao_id"] == id2]
+            comparacao = st.session_state.get("comparacao")
+            if comparacao:
+                id1, id2 = comparacao
 
-        colA, colB = st.columns(2)
+                st.markdown("## Comparação lado a lado")
 
-        with colA:
-            st.subheader("Avaliação 1")
-            for _, row in fotos1.iterrows():
-                conteudo = baixar_imagem_github(row["arquivo"])
-                if conteudo:
-                    st.image(conteudo, caption=row["data"])
-                else:
-                    st.warning("Imagem não encontrada no GitHub.")
-
-        with colB:
-            st.subheader("Avaliação 2")
-            for _, row in fotos2.iterrows():
-                conteudo = baixar_imagem_github(row["arquivo"])
-                if conteudo:
-                    st.image(conteudo, caption=row["data"])
-                else:
-                    st.warning("Imagem não encontrada no GitHub.")
\ No newline at end of file
+                img_df = load_csv(
+                    IMAGENS_PATH,
+                    cols=["avaliacao_id", "arquivo", "data"],
+                    filtro=("avaliacao_id", [id1, id2])
+                )
+
+                fotos1 = img_df[img_df["avaliacao_id"] == id1]
+                fotos2 = img_df[img_df["avaliacao_id"] == id2]
+
+                colA, colB = st.columns(2)
+
+                with colA:
+                    st.subheader("Avaliação 1")
+                    for _, row in fotos1.iterrows():
+                        conteudo = carregar_imagem(row["arquivo"], imagens_locais)
+                        if conteudo:
+                            st.image(conteudo, caption=row["data"])
+                        else:
+                            st.warning("Imagem não encontrada no GitHub.")
+
+                with colB:
+                    st.subheader("Avaliação 2")
+                    for _, row in fotos2.iterrows():
+                        conteudo = carregar_imagem(row["arquivo"], imagens_locais)
+                        if conteudo:
+                            st.image(conteudo, caption=row["data"])
+                        else:
+                            st.warning("Imagem não encontrada no GitHub.")
\ No newline at end of file